@@ -14,13 +14,37 @@ import os
 import sys
 import re
 import json
+import time
+import bisect
+import random
 import hashlib
 import shutil
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Працюємо через stdlib json
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None  # Fallback на blake2b для ID чанків
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None  # Fallback на чисто-Python ядро CDC
+    njit = None
+
 # Fix Windows console encoding for Ukrainian
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding="utf-8")
@@ -42,9 +66,48 @@ LOGS_DIR = Path(__file__).parent / "logs"
 
 NAMESPACE = "default"
 
-# Параметри chunking
+# Алгоритм хешування вмісту (тільки детектор змін, не криптографія).
+# Зміна алгоритму => всі файли разово визначаться як CHANGED і перезаллються
+HASH_ALGO = "blake2b"
+
+# Параметри chunking. Розмір рахуємо в символах, а не в токенах:
+# токенізатор не потрібен, а 4 символи ≈ 1 токен для української
 CHUNK_SIZE_CHARS = 2000  # ~500 токенів для української
 MIN_CHUNK_CHARS = 100    # Ігнорувати занадто короткі
+CHUNK_STRIDE = int(os.getenv("CHUNK_STRIDE", int(0.75 * CHUNK_SIZE_CHARS)))  # Крок вікна (25% перекриття)
+
+# Content-defined chunking для великих документів: межі чанків залежать від
+# вмісту, тому правка на початку файлу не зсуває ID решти чанків
+CDC_THRESHOLD_CHARS = 20000  # Документи довші — через gear_chunk
+CDC_MIN_CHARS = 500
+CDC_MAX_CHARS = 4000
+GEAR_MASK = (1 << 11) - 1    # Середній розмір чанка ~CDC_MIN_CHARS + 2048
+GEAR_RNG = random.Random(20251205)  # Фіксований seed — стабільні межі між запусками
+GEAR_TABLE = tuple(GEAR_RNG.getrandbits(64) for _ in range(256))
+
+# Патерни розбиття тексту (компілюються один раз)
+PARA_SPLIT_RE = re.compile(r'\n\s*\n')
+SENT_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+LEADING_WS_RE = re.compile(r'\s*')
+
+# Категорії документів: іменовані групи — назва групи і є категорією.
+# re.IGNORECASE робить Unicode-свідоме порівняння (закон/Закон, gem/Gem)
+# без виділення lower/casefold-копії імені файлу.
+# Порядок груп задає пріоритет категорій (research найвищий):
+# categorize_document перебирає всі збіги, а не лише найлівіший
+CATEGORY_RE = re.compile(
+    r"(?P<research>gem)"
+    r"|(?P<legislation>закон)"
+    r"|(?P<article>expert|article)"
+    r"|(?P<contract>договір|договор|nda)"
+    r"|(?P<analysis>аналіз)",
+    re.IGNORECASE
+)
+
+# Параметри upload
+UPLOAD_BATCH_SIZE = 96     # Ліміт Pinecone для text records
+POOL_THREADS = 10          # Потоків для паралельного upsert (більше — ризик 429)
+UPSERT_MAX_RETRIES = 5     # Повторів батчу при rate limit (429)
 
 
 class Logger:
@@ -55,7 +118,9 @@ class Logger:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.log_file = LOGS_DIR / f"upload_{timestamp}.log"
         self.report_file = LOGS_DIR / f"report_{timestamp}.json"
-        self.logs = []
+        self.lock = threading.Lock()  # log() викликається і з worker-потоків
+        # Лог пишеться на диск одразу, порядково — без накопичення в пам'яті
+        self.log_fp = self.log_file.open("w", encoding="utf-8", buffering=1)
         self.report = {
             "timestamp": datetime.now().isoformat(),
             "status": "started",
@@ -70,8 +135,10 @@ class Logger:
     def log(self, message: str, level: str = "INFO"):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         formatted = f"[{timestamp}] [{level}] {message}"
-        print(formatted)
-        self.logs.append(formatted)
+        with self.lock:
+            print(formatted)
+            if not self.log_fp.closed:
+                self.log_fp.write(formatted + "\n")
 
     def info(self, message: str):
         self.log(message, "INFO")
@@ -89,14 +156,18 @@ class Logger:
 
     def section(self, title: str):
         separator = "=" * 60
-        print(f"\n{separator}")
-        print(f"  {title}")
-        print(f"{separator}")
-        self.logs.append(f"\n{separator}\n  {title}\n{separator}")
+        block = f"\n{separator}\n  {title}\n{separator}"
+        with self.lock:
+            print(block)
+            if not self.log_fp.closed:
+                self.log_fp.write(block + "\n")
 
     def subsection(self, title: str):
-        print(f"\n--- {title} ---")
-        self.logs.append(f"\n--- {title} ---")
+        block = f"\n--- {title} ---"
+        with self.lock:
+            print(block)
+            if not self.log_fp.closed:
+                self.log_fp.write(block + "\n")
 
     def add_file_report(self, filename: str, chunks_count: int, status: str, details: dict = None):
         file_report = {
@@ -110,8 +181,10 @@ class Logger:
         self.report["files_processed"].append(file_report)
 
     def save(self):
-        # Зберігаємо текстовий лог
-        self.log_file.write_text("\n".join(self.logs), encoding="utf-8")
+        # Текстовий лог вже на диску — просто закриваємо файл
+        with self.lock:
+            if not self.log_fp.closed:
+                self.log_fp.close()
 
         # Зберігаємо JSON звіт
         self.report_file.write_text(
@@ -122,104 +195,266 @@ class Logger:
         return self.log_file, self.report_file
 
 
+def dumps_json(data: dict) -> bytes:
+    """Серіалізує dict у відформатований UTF-8 JSON (orjson, якщо доступний)."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def loads_json(raw: bytes) -> dict:
+    """Парсить JSON з байтів (orjson, якщо доступний)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@lru_cache(maxsize=1)
 def load_tracking() -> dict:
-    """Завантажує трекінг-файл."""
+    """Завантажує трекінг-файл (один раз на процес, далі — з кешу)."""
     if TRACKING_FILE.exists():
-        return json.loads(TRACKING_FILE.read_text(encoding="utf-8"))
+        return loads_json(TRACKING_FILE.read_bytes())
     return {
         "index": PINECONE_INDEX,
         "namespace": NAMESPACE,
+        "content_hash_algo": HASH_ALGO,
         "last_updated": None,
         "files": {}
     }
 
 
 def save_tracking(tracking: dict):
-    """Зберігає трекінг-файл."""
+    """Зберігає трекінг-файл атомарно; не переписує файл без змін."""
+    tracking["content_hash_algo"] = HASH_ALGO
+
+    # Вміст не змінився (last_updated ще старий) — не чіпаємо файл
+    if TRACKING_FILE.exists() and dumps_json(tracking) == TRACKING_FILE.read_bytes():
+        return
+
     tracking["last_updated"] = datetime.now().isoformat()
-    TRACKING_FILE.write_text(
-        json.dumps(tracking, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+
+    # Атомарний запис через tmp + os.replace — без "порваного" файлу при збої
+    tmp_path = TRACKING_FILE.with_suffix(".tmp")
+    tmp_path.write_bytes(dumps_json(tracking))
+    os.replace(tmp_path, TRACKING_FILE)
 
 
 def compute_file_hash(filepath: Path) -> str:
-    """Обчислює MD5 хеш вмісту файлу."""
-    content = filepath.read_bytes()
-    return hashlib.md5(content).hexdigest()
+    """Обчислює BLAKE2b-128 хеш вмісту файлу (потоково, без читання в пам'ять).
+
+    BLAKE2b SIMD-оптимізований в OpenSSL і помітно швидший за MD5.
+    """
+    with filepath.open("rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+def collect_units(text: str) -> list[tuple[int, int]]:
+    """Повертає (start, end) смислових одиниць тексту.
+
+    Одиниця — абзац; абзаци довші за CHUNK_SIZE_CHARS розбиваються на речення.
+    """
+    spans = []
+    para_start = 0
+    for m in PARA_SPLIT_RE.finditer(text):
+        spans.append((para_start, m.start()))
+        para_start = m.end()
+    spans.append((para_start, len(text)))
+
+    units = []
+    for start, end in spans:
+        # Обрізаємо пробіли по краях абзацу (спереду — одним C-level match)
+        start = LEADING_WS_RE.match(text, start, end).end()
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start == end:
+            continue
+
+        if end - start <= CHUNK_SIZE_CHARS:
+            units.append((start, end))
+            continue
 
+        # Довгий абзац: одиниці — окремі речення
+        sent_start = start
+        for m in SENT_SPLIT_RE.finditer(text, start, end):
+            if m.start() > sent_start:
+                units.append((sent_start, m.start()))
+            sent_start = m.end()
+        if sent_start < end:
+            units.append((sent_start, end))
+
+    return units
+
+
+def chunk_text(text: str) -> Iterator[str]:
+    """Генерує chunks ковзним вікном з перекриттям.
+
+    Вікно розміром CHUNK_SIZE_CHARS рухається з кроком CHUNK_STRIDE
+    (за замовчуванням 75% розміру, тобто сусідні чанки перекриваються
+    на 25% для кращого retrieval recall). Межі вікна прив'язуються до
+    абзаців, для занадто довгих абзаців — до речень. Чанки віддаються
+    по одному — споживач сам вирішує, чи матеріалізувати список.
+    """
+    text = text.strip()
+    units = collect_units(text)
+    if not units:
+        return
 
-def chunk_text(text: str) -> list[str]:
-    """Розбиває текст на chunks по абзацах."""
-    paragraphs = re.split(r'\n\s*\n', text)
+    starts = [u[0] for u in units]
+    ends = [u[1] for u in units]
+
+    i = 0
+    while i < len(units):
+        start = starts[i]
+        limit = start + CHUNK_SIZE_CHARS
+
+        # Кінець вікна: остання одиниця, що повністю вміщується
+        # (бінарний пошук по відсортованих ends замість лінійного проходу)
+        j = max(i, bisect.bisect_right(ends, limit) - 1)
+        if ends[j] - start >= MIN_CHUNK_CHARS:
+            yield text[start:ends[j]]
+
+        if j == len(units) - 1:
+            return
+
+        # Початок наступного вікна: перша одиниця після кроку,
+        # але без пропуску одиниць за межами поточного вікна
+        k = bisect.bisect_left(starts, start + CHUNK_STRIDE)
+        i = min(max(k, i + 1), j + 1)
+
+
+def _gear_boundaries_py(text: str) -> list[int]:
+    """Чисто-Python ядро CDC: індекси кінців чанків для тексту."""
+    n = len(text)
+    boundaries = []
+    start = 0
+
+    while start < n:
+        h = 0
+        end = min(start + CDC_MAX_CHARS, n)
+        boundary = end
+        for i in range(start, end):
+            h = ((h << 1) + GEAR_TABLE[ord(text[i]) & 0xFF]) & 0xFFFFFFFFFFFFFFFF
+            if i - start + 1 >= CDC_MIN_CHARS and (h & GEAR_MASK) == 0:
+                boundary = i + 1
+                break
+        boundaries.append(boundary)
+        start = boundary
+
+    return boundaries
+
+
+if njit is not None:
+    # Те саме ядро, скомпільоване numba в нативний цикл: uint64
+    # переповнюється природно, тому явна маска 2^64-1 не потрібна
+    GEAR_TABLE_ARR = np.array(GEAR_TABLE, dtype=np.uint64)
+
+    @njit(cache=True)
+    def _gear_boundaries_jit(codes, table, mask, min_chars, max_chars):
+        n = codes.shape[0]
+        boundaries = []
+        start = 0
+        while start < n:
+            h = np.uint64(0)
+            end = min(start + max_chars, n)
+            boundary = end
+            for i in range(start, end):
+                h = (h << np.uint64(1)) + table[codes[i]]
+                if i - start + 1 >= min_chars and (h & mask) == np.uint64(0):
+                    boundary = i + 1
+                    break
+            boundaries.append(boundary)
+            start = boundary
+        return boundaries
+
+    def _gear_boundaries(text: str) -> list[int]:
+        codes = (np.fromiter(map(ord, text), dtype=np.uint32, count=len(text))
+                 & 0xFF).astype(np.uint8)
+        return _gear_boundaries_jit(
+            codes, GEAR_TABLE_ARR, np.uint64(GEAR_MASK), CDC_MIN_CHARS, CDC_MAX_CHARS
+        )
+else:
+    _gear_boundaries = _gear_boundaries_py
 
-    chunks = []
-    current_chunk = ""
 
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
-            continue
+def gear_chunk(text: str) -> list[str]:
+    """Розбиває текст на chunks за вмістом (rolling Gear-хеш).
 
-        if len(para) > CHUNK_SIZE_CHARS:
-            sentences = re.split(r'(?<=[.!?])\s+', para)
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) + 2 <= CHUNK_SIZE_CHARS:
-                    current_chunk = f"{current_chunk} {sentence}".strip()
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk)
-                    current_chunk = sentence
-        else:
-            if len(current_chunk) + len(para) + 2 <= CHUNK_SIZE_CHARS:
-                current_chunk = f"{current_chunk}\n\n{para}".strip()
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                current_chunk = para
+    Межа чанка ставиться там, де хеш вікна потрапляє в GEAR_MASK, тому
+    однакові фрагменти тексту завжди дають однакові чанки незалежно від
+    позиції в документі. Разом з content-адресними ID це робить повторне
+    завантаження зміненого документа no-op для незмінених чанків.
 
-    if current_chunk:
-        chunks.append(current_chunk)
+    Пошук меж — посимвольний цикл, єдине по-справжньому гаряче місце
+    пайплайна; за наявності numba він виконується нативним кодом.
+    """
+    chunks = []
+    start = 0
+    for boundary in _gear_boundaries(text):
+        if boundary - start >= MIN_CHUNK_CHARS:
+            chunks.append(text[start:boundary])
+        start = boundary
 
-    return [c for c in chunks if len(c) >= MIN_CHUNK_CHARS]
+    return chunks
 
 
+@lru_cache(maxsize=4096)
 def categorize_document(filename: str) -> str:
-    """Категоризує документ за назвою."""
-    name = filename.lower()
-
-    if "закон" in name:
-        return "legislation"
-    if "gem" in name:
-        return "research"
-    if "expert" in name or "article" in name:
-        return "article"
-    if "аналіз" in name:
-        return "analysis"
-    if "договір" in name or "договор" in name or "nda" in name:
-        return "contract"
+    """Категоризує документ за назвою (результат кешується по імені файлу).
 
-    return "other"
+    search() повернув би найлівіший збіг, тому перебираємо всі збіги
+    й лишаємо групу з найвищим пріоритетом ("Аналіз Gem 7" — research).
+    """
+    best = None
+    for m in CATEGORY_RE.finditer(filename):
+        if m.lastindex == 1:
+            return m.lastgroup  # Найвищий пріоритет — далі шукати нема сенсу
+        if best is None or m.lastindex < best.lastindex:
+            best = m
+    return best.lastgroup if best else "other"
 
 
 def generate_id(filename: str, chunk_index: int, text: str) -> str:
-    """Генерує унікальний ID для chunk."""
+    """Генерує унікальний ID для chunk (16 hex-символів).
+
+    XXH3-128 — найшвидший варіант xxhash для коротких і довгих входів;
+    ID — не секрет, тому криптографічний хеш не потрібен. Повний текст
+    чанка хешується через update(), без проміжної конкатенації.
+    """
+    if xxhash is not None:
+        hasher = xxhash.xxh3_128()
+        hasher.update(f"{filename}|{chunk_index}|".encode())
+        hasher.update(text.encode("utf-8"))
+        return hasher.hexdigest()[:16]
     hash_input = f"{filename}_{chunk_index}_{text[:50]}"
-    return hashlib.md5(hash_input.encode()).hexdigest()[:16]
+    return hashlib.blake2b(hash_input.encode(), digest_size=8).hexdigest()
+
+
+def generate_content_id(text: str) -> str:
+    """Content-адресний ID: однаковий текст чанка -> той самий ID у Pinecone."""
+    if xxhash is not None:
+        return xxhash.xxh3_128(text.encode("utf-8")).hexdigest()[:16]
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
 
 
 def process_file(filepath: Path, logger: Logger) -> tuple[list[dict], list[str]]:
     """Обробляє файл: читає, chunking, повертає records та chunk_ids."""
     text = filepath.read_text(encoding="utf-8")
-    chunks = chunk_text(text)
+
+    # Великі документи — content-defined chunking зі стабільними ID,
+    # щоб правки не змушували перезаливати весь файл
+    if len(text) > CDC_THRESHOLD_CHARS:
+        chunks = gear_chunk(text)
+        chunk_ids = [generate_content_id(c) for c in chunks]
+    else:
+        # Матеріалізуємо: records потребують total_chunks наперед
+        chunks = list(chunk_text(text))
+        chunk_ids = [generate_id(filepath.name, i, c) for i, c in enumerate(chunks)]
 
     doc_type = categorize_document(filepath.name)
 
     records = []
-    chunk_ids = []
     for i, chunk in enumerate(chunks):
-        chunk_id = generate_id(filepath.name, i, chunk)
-        chunk_ids.append(chunk_id)
+        chunk_id = chunk_ids[i]
         records.append({
             "_id": chunk_id,
             "text": chunk,
@@ -237,8 +472,11 @@ def process_file(filepath: Path, logger: Logger) -> tuple[list[dict], list[str]]
     return records, chunk_ids
 
 
-def save_chunks_to_staging(records: list[dict], filename: str, logger: Logger) -> Path:
-    """Зберігає чанки в staging директорію."""
+def save_chunks_to_staging(records: list[dict], filename: str, logger: Logger) -> tuple[Path, dict]:
+    """Зберігає чанки в staging директорію.
+
+    Повертає також chunks_data, щоб архівування не перечитувало JSON з диска.
+    """
     CHUNKS_DIR.mkdir(exist_ok=True)
 
     chunks_data = {
@@ -259,29 +497,22 @@ def save_chunks_to_staging(records: list[dict], filename: str, logger: Logger) -
 
     safe_filename = filename.replace("/", "_").replace("\\", "_")
     output_path = CHUNKS_DIR / f"{safe_filename}.json"
-    output_path.write_text(
-        json.dumps(chunks_data, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+    output_path.write_bytes(dumps_json(chunks_data))
 
     logger.info(f"    Staging: {output_path.name}")
-    return output_path
+    return output_path, chunks_data
 
 
-def move_chunks_to_archive(staging_path: Path, logger: Logger) -> Path:
-    """Переміщує чанки зі staging в архів."""
+def move_chunks_to_archive(chunks_data: dict, staging_path: Path, logger: Logger) -> Path:
+    """Переміщує чанки зі staging в архів (без перечитування staging JSON)."""
     ARCHIVED_CHUNKS_DIR.mkdir(exist_ok=True)
 
-    # Оновлюємо статус в файлі
-    data = json.loads(staging_path.read_text(encoding="utf-8"))
-    data["status"] = "archived"
-    data["archived_at"] = datetime.now().isoformat()
+    # Оновлюємо статус в уже наявному dict
+    chunks_data["status"] = "archived"
+    chunks_data["archived_at"] = datetime.now().isoformat()
 
     archive_path = ARCHIVED_CHUNKS_DIR / staging_path.name
-    archive_path.write_text(
-        json.dumps(data, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+    archive_path.write_bytes(dumps_json(chunks_data))
 
     # Видаляємо зі staging
     staging_path.unlink()
@@ -308,11 +539,18 @@ def analyze_changes(files: list[Path], tracking: dict, logger: Logger) -> dict:
     new_files = []
     changed_files = []
     unchanged_files = []
-    orphan_chunk_ids = []
+
+    # Хешуємо всі файли паралельно: hashlib відпускає GIL на великих буферах.
+    # Результат також повертається, щоб не хешувати повторно на КРОЦІ 5
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        file_hashes = {
+            filepath.name: file_hash
+            for filepath, file_hash in zip(files, executor.map(compute_file_hash, files))
+        }
 
     for filepath in files:
         filename = filepath.name
-        current_hash = compute_file_hash(filepath)
+        current_hash = file_hashes[filename]
 
         if filename not in tracked_files:
             new_files.append(filepath)
@@ -320,7 +558,6 @@ def analyze_changes(files: list[Path], tracking: dict, logger: Logger) -> dict:
         elif tracked_files[filename]["content_hash"] != current_hash:
             changed_files.append(filepath)
             old_chunks = len(tracked_files[filename]["chunk_ids"])
-            orphan_chunk_ids.extend(tracked_files[filename]["chunk_ids"])
             logger.info(f"  [CHANGED] {filename} (old: {old_chunks} chunks)")
         else:
             unchanged_files.append(filepath)
@@ -330,35 +567,104 @@ def analyze_changes(files: list[Path], tracking: dict, logger: Logger) -> dict:
         "new_files": new_files,
         "changed_files": changed_files,
         "unchanged_files": unchanged_files,
-        "orphan_chunk_ids": orphan_chunk_ids
+        "file_hashes": file_hashes
     }
 
 
-def delete_orphan_chunks(index, orphan_ids: list[str], logger: Logger):
-    """Видаляє застарілі чанки з Pinecone."""
+def delete_orphan_chunks(index, orphan_ids: set[str], logger: Logger):
+    """Видаляє застарілі чанки з Pinecone (батчі паралельно)."""
     if not orphan_ids:
         return
 
     logger.info(f"Видалення {len(orphan_ids)} застарілих чанків...")
 
     batch_size = 1000
-    for i in range(0, len(orphan_ids), batch_size):
-        batch = orphan_ids[i:i + batch_size]
-        index.delete(namespace=NAMESPACE, ids=batch)
-        logger.info(f"  Видалено batch: {len(batch)} IDs")
+    orphan_list = list(orphan_ids)
+    batches = [
+        orphan_list[i:i + batch_size]
+        for i in range(0, len(orphan_list), batch_size)
+    ]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(index.delete, namespace=NAMESPACE, ids=batch)
+            for batch in batches
+        ]
+        for batch, future in zip(batches, futures):
+            future.result()
+            logger.info(f"  Видалено batch: {len(batch)} IDs")
+
+
+def get_upsert_result(index, batch: list[dict], async_result):
+    """Чекає результат async upsert; на 429 повторює батч з exponential backoff."""
+    try:
+        return async_result.get()
+    except Exception as e:
+        if getattr(e, "status", None) != 429:
+            raise
+
+    # Rate limit: повторюємо батч синхронно з наростаючою паузою
+    for attempt in range(UPSERT_MAX_RETRIES):
+        time.sleep(min(2 ** attempt, 60))
+        try:
+            return index.upsert_records(NAMESPACE, batch)
+        except Exception as e:
+            if getattr(e, "status", None) != 429 or attempt == UPSERT_MAX_RETRIES - 1:
+                raise
+
+
+def upload_records(index, all_records: list[dict], logger: Logger) -> tuple[int, list[str]]:
+    """Завантажує records паралельними батчами через пул потоків SDK."""
+    batches = [
+        all_records[i:i + UPLOAD_BATCH_SIZE]
+        for i in range(0, len(all_records), UPLOAD_BATCH_SIZE)
+    ]
+
+    # Всі батчі відправляються одразу, результати збираються нижче
+    async_results = [
+        index.upsert_records(NAMESPACE, batch, async_req=True)
+        for batch in batches
+    ]
+
+    uploaded_count = 0
+    upload_errors = []
+
+    for batch_num, (batch, async_result) in enumerate(zip(batches, async_results), start=1):
+        try:
+            get_upsert_result(index, batch, async_result)
+            uploaded_count += len(batch)
+            logger.info(f"  Batch {batch_num}/{len(batches)}: {len(batch)} records ✓")
+        except Exception as e:
+            error_msg = f"Batch {batch_num} failed: {e}"
+            logger.error(error_msg)
+            upload_errors.append(error_msg)
+
+    return uploaded_count, upload_errors
 
 
 def verify_upload(index, chunk_ids: list[str], logger: Logger) -> bool:
-    """Перевіряє що всі чанки успішно завантажені."""
-    import time
-    time.sleep(2)  # Чекаємо на індексацію
+    """Перевіряє що всі чанки успішно завантажені.
+
+    Опитує describe_index_stats до 10 секунд і виходить одразу, щойно
+    кількість векторів у namespace досягла очікуваної — без фіксованого sleep.
+    """
+    expected = len(chunk_ids)
+    deadline = time.monotonic() + 10
+    total_vectors = 0
+
+    while time.monotonic() < deadline:
+        stats = index.describe_index_stats()
+        ns_stats = stats.namespaces.get(NAMESPACE, {})
+        total_vectors = getattr(ns_stats, 'vector_count', 0)
+
+        if total_vectors >= expected:
+            logger.info(f"  Векторів в індексі: {total_vectors}")
+            return True
 
-    stats = index.describe_index_stats()
-    ns_stats = stats.namespaces.get(NAMESPACE, {})
-    total_vectors = getattr(ns_stats, 'vector_count', 0)
+        time.sleep(0.5)
 
-    logger.info(f"  Векторів в індексі: {total_vectors}")
-    return True  # Базова перевірка
+    logger.info(f"  Векторів в індексі: {total_vectors} (очікувалось >= {expected})")
+    return False
 
 
 def main():
@@ -389,7 +695,7 @@ def main():
     logger.subsection("КРОК 1: Підключення до Pinecone")
     try:
         pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(PINECONE_INDEX)
+        index = pc.Index(PINECONE_INDEX, pool_threads=POOL_THREADS)
         stats = index.describe_index_stats()
         total_vectors = sum(
             getattr(ns, 'vector_count', 0)
@@ -404,7 +710,12 @@ def main():
 
     # ===== КРОК 2: Пошук файлів =====
     logger.subsection("КРОК 2: Пошук нових документів")
-    files = [f for f in SOURCE_DIR.glob("*.md") if f.name != "desktop.ini"]
+    # os.scandir не робить зайвих stat() на кожен файл, на відміну від glob
+    with os.scandir(SOURCE_DIR) as entries:
+        files = [
+            Path(entry.path) for entry in entries
+            if entry.is_file() and entry.name.endswith(".md") and entry.name != "desktop.ini"
+        ]
     logger.info(f"Знайдено в {SOURCE_DIR.name}/: {len(files)} файлів")
 
     if not files:
@@ -425,9 +736,6 @@ def main():
     logger.info(f"  Змінених файлів: {len(changes['changed_files'])}")
     logger.info(f"  Без змін: {len(changes['unchanged_files'])}")
 
-    if changes['orphan_chunk_ids']:
-        logger.warning(f"  Застарілих чанків для видалення: {len(changes['orphan_chunk_ids'])}")
-
     files_to_process = changes['new_files'] + changes['changed_files']
 
     if not files_to_process:
@@ -439,36 +747,24 @@ def main():
         logger.info(f"Звіт: {report_file}")
         return
 
-    # ===== КРОК 4: Видалення orphan chunks =====
-    if changes['orphan_chunk_ids']:
-        logger.subsection("КРОК 4: Видалення застарілих чанків")
-        delete_orphan_chunks(index, changes['orphan_chunk_ids'], logger)
-        logger.report["orphans_deleted"] = len(changes['orphan_chunk_ids'])
-
-    # ===== КРОК 5: Chunking (staging) =====
-    logger.subsection("КРОК 5: Chunking документів (staging)")
-    all_records = []
-    staging_files = {}  # filename -> staging_path
+    # ===== КРОК 4: Chunking (staging) =====
+    # Chunking — ДО видалення: для CDC-файлів нові content-адресні ID
+    # здебільшого збігаються зі старими, тому видаляємо лише old - new,
+    # а чанки зі знайомими ID не перезаливаємо взагалі
+    logger.subsection("КРОК 4: Chunking документів (staging)")
+    staging_files = {}  # filename -> staging_path + records
     files_tracking = {}
+    processed = {}      # filename -> (filepath, records, chunk_ids)
 
     for filepath in files_to_process:
         logger.info(f"\nОбробка: {filepath.name}")
 
         records, chunk_ids = process_file(filepath, logger)
-        all_records.extend(records)
-
-        # Зберігаємо в staging
-        staging_path = save_chunks_to_staging(records, filepath.name, logger)
-        staging_files[filepath.name] = {
-            "source_path": filepath,
-            "staging_path": staging_path,
-            "records": records,
-            "chunk_ids": chunk_ids
-        }
+        processed[filepath.name] = (filepath, records, chunk_ids)
 
         # Готуємо дані для трекінгу
         files_tracking[filepath.name] = {
-            "content_hash": compute_file_hash(filepath),
+            "content_hash": changes['file_hashes'][filepath.name],
             "chunk_ids": chunk_ids,
             "chunks_count": len(chunk_ids),
             "uploaded_at": None  # Заповнимо після успішного upload
@@ -476,28 +772,49 @@ def main():
 
         logger.report["chunks_created"] += len(records)
 
-    logger.info(f"\nВсього чанків для завантаження: {len(all_records)}")
+    # Staging-файли пишемо паралельно: JSON dump + запис на диск I/O-bound
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {
+            filename: executor.submit(save_chunks_to_staging, records, filename, logger)
+            for filename, (filepath, records, chunk_ids) in processed.items()
+        }
+        for filename, future in futures.items():
+            staging_path, chunks_data = future.result()
+            filepath, records, chunk_ids = processed[filename]
+            staging_files[filename] = {
+                "source_path": filepath,
+                "staging_path": staging_path,
+                "chunks_data": chunks_data,
+                "records": records,
+                "chunk_ids": chunk_ids
+            }
 
-    # ===== КРОК 6: Upload до Pinecone =====
-    logger.subsection("КРОК 6: Завантаження в Pinecone")
-    batch_size = 96
-    uploaded_count = 0
-    upload_errors = []
+    # Порівнюємо старі й нові chunk ID: видаляємо лише зниклі. Чанки зі
+    # збіжними ID все одно перезаписуються (no-op upsert) — після правки
+    # файлу їхні chunk_index/total_chunks в metadata могли зміститися
+    orphan_chunk_ids = set()
+    reused_total = 0
+    all_records = []
+    for filename, (filepath, records, chunk_ids) in processed.items():
+        old_ids = set(tracking['files'].get(filename, {}).get('chunk_ids') or [])
+        new_ids = set(chunk_ids)
+        orphan_chunk_ids |= old_ids - new_ids
+        reused_total += len(old_ids & new_ids)
+        all_records.extend(records)
 
-    for i in range(0, len(all_records), batch_size):
-        batch = all_records[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        total_batches = (len(all_records) + batch_size - 1) // batch_size
+    if reused_total:
+        logger.info(f"\nЧанків зі стабільними ID (no-op upsert): {reused_total}")
+    logger.info(f"\nВсього чанків для завантаження: {len(all_records)}")
 
-        try:
-            index.upsert_records(NAMESPACE, batch)
-            uploaded_count += len(batch)
-            logger.info(f"  Batch {batch_num}/{total_batches}: {len(batch)} records ✓")
-        except Exception as e:
-            error_msg = f"Batch {batch_num} failed: {e}"
-            logger.error(error_msg)
-            upload_errors.append(error_msg)
+    # ===== КРОК 5: Видалення orphan chunks =====
+    if orphan_chunk_ids:
+        logger.subsection("КРОК 5: Видалення застарілих чанків")
+        delete_orphan_chunks(index, orphan_chunk_ids, logger)
+        logger.report["orphans_deleted"] = len(orphan_chunk_ids)
 
+    # ===== КРОК 6: Upload до Pinecone =====
+    logger.subsection("КРОК 6: Завантаження в Pinecone")
+    uploaded_count, upload_errors = upload_records(index, all_records, logger)
     logger.report["chunks_uploaded"] = uploaded_count
 
     if upload_errors:
@@ -520,7 +837,7 @@ def main():
         logger.info(f"\nАрхівування: {filename}")
 
         # Переміщуємо чанки в архів
-        move_chunks_to_archive(file_data["staging_path"], logger)
+        move_chunks_to_archive(file_data["chunks_data"], file_data["staging_path"], logger)
 
         # Переміщуємо source документ
         move_source_to_archive(file_data["source_path"], logger)
@@ -5,11 +5,14 @@
 
 import os
 import sys
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
+from chunk_and_upload import dumps_json
+
 # Fix Windows console encoding for Ukrainian
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding="utf-8")
@@ -22,6 +25,60 @@ PINECONE_INDEX = os.getenv("PINECONE_INDEX", "accounting-policy")
 CHUNKS_DIR = Path(__file__).parent.parent / "archived_chunks"
 NAMESPACE = "default"
 
+FETCH_THREADS = 10  # Паралельних fetch-запитів до Pinecone
+
+
+def flush_file_chunks(file_data: dict, summary: dict, lock: threading.Lock):
+    """Записує зібрані чанки файлу на диск та оновлює підсумок."""
+    file_data["chunks"].sort(key=lambda x: x["chunk_index"])
+
+    safe_filename = file_data["filename"].replace("/", "_").replace("\\", "_")
+    output_path = CHUNKS_DIR / f"{safe_filename}.json"
+    output_path.write_bytes(dumps_json(file_data))
+
+    with lock:
+        summary[file_data["filename"]] = {
+            "chunks_count": len(file_data["chunks"]),
+            "chunk_ids": [c["id"] for c in file_data["chunks"]]
+        }
+
+
+def fetch_batch(index, batch_ids: list, files_data: dict, summary: dict, lock: threading.Lock):
+    """Фетчить batch ID та розкладає записи по файлових буферах.
+
+    Щойно файл зібрав усі свої чанки (total_chunks) — він одразу
+    пишеться на диск і звільняє пам'ять, без загального словника записів.
+    """
+    result = index.fetch(ids=batch_ids, namespace=NAMESPACE)
+
+    completed = []
+    with lock:
+        for record_id, record in result.vectors.items():
+            metadata = dict(record.metadata) if record.metadata else {}
+            filename = metadata.get("filename", "unknown")
+
+            if filename not in files_data:
+                files_data[filename] = {
+                    "filename": filename,
+                    "doc_type": metadata.get("doc_type", "unknown"),
+                    "total_chunks": metadata.get("total_chunks", 0),
+                    "chunks": []
+                }
+
+            file_data = files_data[filename]
+            file_data["chunks"].append({
+                "id": record_id,
+                "chunk_index": metadata.get("chunk_index", 0),
+                "text": metadata.get("text", "")  # Текст в metadata
+            })
+
+            if len(file_data["chunks"]) == file_data["total_chunks"]:
+                completed.append(files_data.pop(filename))
+
+    # Запис на диск — поза lock, щоб не блокувати інші потоки
+    for file_data in completed:
+        flush_file_chunks(file_data, summary, lock)
+
 
 def download_all_chunks():
     """Завантажує всі чанки з Pinecone та зберігає локально."""
@@ -38,7 +95,7 @@ def download_all_chunks():
     print(f"\nПапка для чанків: {CHUNKS_DIR}")
 
     # Підключення
-    print(f"\n[1/4] Підключення до Pinecone...")
+    print(f"\n[1/3] Підключення до Pinecone...")
     pc = Pinecone(api_key=PINECONE_API_KEY)
     index = pc.Index(PINECONE_INDEX)
     print(f"      Index: {PINECONE_INDEX}")
@@ -54,97 +111,53 @@ def download_all_chunks():
         print("\n      INFO: Індекс порожній, немає чанків для завантаження")
         return
 
-    # Отримання всіх ID
-    print(f"\n[2/4] Отримання списку ID...")
-    all_ids = []
-
-    for ids_batch in index.list(namespace=NAMESPACE):
-        all_ids.extend(ids_batch)
-        print(f"      Отримано: {len(all_ids)} IDs", end="\r")
-
-    print(f"      Всього ID: {len(all_ids)}          ")
+    # Завантаження записів конвеєром: кожна сторінка index.list одразу
+    # віддається на fetch у пул потоків, записи стрімляться у файлові
+    # буфери, а заповнені файли відразу пишуться на диск
+    print(f"\n[2/3] Завантаження записів (list + fetch конвеєром)...")
+    files_data = {}  # filename -> буфер чанків (ще не всі зібрані)
+    summary = {}     # filename -> chunks_count + chunk_ids (вже на диску)
+    lock = threading.Lock()
+    total_ids = 0
+
+    with ThreadPoolExecutor(max_workers=FETCH_THREADS) as executor:
+        futures = []
+        for ids_batch in index.list(namespace=NAMESPACE):
+            batch_ids = list(ids_batch)
+            total_ids += len(batch_ids)
+            futures.append(executor.submit(fetch_batch, index, batch_ids, files_data, summary, lock))
+            print(f"      В роботі: {total_ids} IDs", end="\r")
+
+        for future in futures:
+            future.result()
+
+    # Файли з неповним набором чанків (total_chunks не зійшовся) — дозаписуємо
+    for file_data in list(files_data.values()):
+        flush_file_chunks(file_data, summary, lock)
+    files_data.clear()
+
+    total_records = sum(meta["chunks_count"] for meta in summary.values())
+    print(f"      Завантажено: {total_records} записів          ")
+
+    # Загальний індекс
+    print(f"\n[3/3] Збереження індексу...")
+    for filename, meta in summary.items():
+        print(f"      {filename}: {meta['chunks_count']} chunks")
 
-    # Завантаження записів (batch по 100)
-    print(f"\n[3/4] Завантаження записів...")
-    all_records = {}
-    batch_size = 100
-
-    for i in range(0, len(all_ids), batch_size):
-        batch_ids = all_ids[i:i + batch_size]
-        result = index.fetch(ids=batch_ids, namespace=NAMESPACE)
-
-        for record_id, record in result.vectors.items():
-            all_records[record_id] = {
-                "id": record_id,
-                "metadata": dict(record.metadata) if record.metadata else {}
-            }
-
-        downloaded = min(i + batch_size, len(all_ids))
-        print(f"      Завантажено: {downloaded}/{len(all_ids)}", end="\r")
-
-    print(f"      Завантажено: {len(all_records)} записів          ")
-
-    # Групування по файлах
-    print(f"\n[4/4] Збереження локально...")
-    files_data = {}
-
-    for record_id, record in all_records.items():
-        metadata = record["metadata"]
-        filename = metadata.get("filename", "unknown")
-
-        if filename not in files_data:
-            files_data[filename] = {
-                "filename": filename,
-                "doc_type": metadata.get("doc_type", "unknown"),
-                "total_chunks": metadata.get("total_chunks", 0),
-                "chunks": []
-            }
-
-        files_data[filename]["chunks"].append({
-            "id": record_id,
-            "chunk_index": metadata.get("chunk_index", 0),
-            "text": metadata.get("text", "")  # Текст в metadata
-        })
-
-    # Сортування чанків по індексу
-    for filename in files_data:
-        files_data[filename]["chunks"].sort(key=lambda x: x["chunk_index"])
-
-    # Збереження по файлах
-    for filename, data in files_data.items():
-        safe_filename = filename.replace("/", "_").replace("\\", "_")
-        output_path = CHUNKS_DIR / f"{safe_filename}.json"
-
-        output_path.write_text(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
-        print(f"      {filename}: {len(data['chunks'])} chunks")
-
-    # Зберігаємо також загальний індекс
     index_data = {
         "pinecone_index": PINECONE_INDEX,
         "namespace": NAMESPACE,
-        "total_records": len(all_records),
-        "files": {
-            filename: {
-                "chunks_count": len(data["chunks"]),
-                "chunk_ids": [c["id"] for c in data["chunks"]]
-            }
-            for filename, data in files_data.items()
-        }
+        "total_records": total_records,
+        "files": summary
     }
 
     index_path = CHUNKS_DIR / "_index.json"
-    index_path.write_text(
-        json.dumps(index_data, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+    index_path.write_bytes(dumps_json(index_data))
 
     print("\n" + "=" * 60)
     print(f"ГОТОВО!")
-    print(f"  Завантажено: {len(all_records)} chunks")
-    print(f"  Файлів: {len(files_data)}")
+    print(f"  Завантажено: {total_records} chunks")
+    print(f"  Файлів: {len(summary)}")
     print(f"  Збережено в: {CHUNKS_DIR}")
     print("=" * 60)
 
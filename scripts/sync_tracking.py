@@ -5,8 +5,8 @@
 Запуск: python scripts/sync_tracking.py
 """
 
+import os
 import sys
-import json
 from pathlib import Path
 
 # Fix Windows console encoding for Ukrainian
@@ -18,6 +18,7 @@ from chunk_and_upload import (
     load_tracking,
     save_tracking,
     compute_file_hash,
+    loads_json,
     PINECONE_INDEX,
     NAMESPACE
 )
@@ -38,11 +39,40 @@ def sync_from_local_chunks():
         print("Спочатку завантажте чанки: python scripts/download_chunks.py")
         return
 
-    # Знаходимо всі JSON файли з чанками (крім _index.json)
-    chunk_files = [f for f in CHUNKS_DIR.glob("*.json") if f.name != "_index.json"]
-    print(f"\nЗнайдено файлів з чанками: {len(chunk_files)}")
-
-    if not chunk_files:
+    # Швидкий шлях: download_chunks.py вже зібрав chunk_ids всіх файлів
+    # в _index.json — читаємо один файл замість N. Але upload-пайплайн
+    # докладає per-file JSON в архів, не оновлюючи _index.json, тому
+    # довіряємо йому лише коли він не старіший за жоден файл з чанками
+    index_path = CHUNKS_DIR / "_index.json"
+    chunk_files = []
+    newest_mtime = 0.0
+    with os.scandir(CHUNKS_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".json") and entry.name != "_index.json":
+                chunk_files.append(Path(entry.path))
+                newest_mtime = max(newest_mtime, entry.stat().st_mtime)
+
+    if index_path.exists() and index_path.stat().st_mtime >= newest_mtime:
+        index_data = loads_json(index_path.read_bytes())
+        chunk_entries = [
+            (filename, meta.get("chunk_ids", []), None)
+            for filename, meta in index_data.get("files", {}).items()
+        ]
+        print(f"\nЗнайдено файлів в _index.json: {len(chunk_entries)}")
+    else:
+        # Fallback: _index.json відсутній або застарілий — читаємо
+        # кожен файл з чанками
+        chunk_entries = []
+        for chunk_file in chunk_files:
+            chunk_data = loads_json(chunk_file.read_bytes())
+            chunk_entries.append((
+                chunk_data.get("filename", chunk_file.stem),
+                [c["id"] for c in chunk_data.get("chunks", [])],
+                chunk_data.get("uploaded_at")
+            ))
+        print(f"\nЗнайдено файлів з чанками: {len(chunk_entries)}")
+
+    if not chunk_entries:
         print("Немає файлів для синхронізації")
         return
 
@@ -56,13 +86,7 @@ def sync_from_local_chunks():
     skipped = 0
     updated = 0
 
-    for chunk_file in chunk_files:
-        # Читаємо дані чанків
-        chunk_data = json.loads(chunk_file.read_text(encoding="utf-8"))
-        filename = chunk_data.get("filename", chunk_file.stem)
-
-        # Отримуємо chunk IDs з локального файлу
-        chunk_ids = [c["id"] for c in chunk_data.get("chunks", [])]
+    for filename, chunk_ids, uploaded_at in chunk_entries:
         chunks_count = len(chunk_ids)
 
         # Шукаємо оригінальний файл для обчислення хешу
@@ -71,15 +95,16 @@ def sync_from_local_chunks():
             content_hash = compute_file_hash(source_file)
             source_location = "archived_source_docs"
         else:
-            # Якщо оригіналу немає - використовуємо хеш з chunk_ids
-            content_hash = f"chunks_only_{chunk_file.stem[:16]}"
+            # Якщо оригіналу немає - використовуємо хеш з назви файлу
+            content_hash = f"chunks_only_{Path(filename).stem[:16]}"
             source_location = "chunks_only"
 
         # Перевіряємо чи вже є в трекінгу
         if filename in tracking.get("files", {}):
             existing = tracking["files"][filename]
-            # Порівнюємо chunk_ids
-            if set(existing.get("chunk_ids", [])) == set(chunk_ids):
+            existing_ids = existing.get("chunk_ids") or []
+            # Дешева перевірка довжини — set будуємо лише коли розміри збігаються
+            if len(existing_ids) == len(chunk_ids) and set(existing_ids) == set(chunk_ids):
                 print(f"  ⏭️  {filename} - без змін")
                 skipped += 1
                 continue
@@ -95,7 +120,7 @@ def sync_from_local_chunks():
             "content_hash": content_hash,
             "chunk_ids": chunk_ids,
             "chunks_count": chunks_count,
-            "uploaded_at": chunk_data.get("uploaded_at", "2025-12-01T00:00:00"),
+            "uploaded_at": uploaded_at or "2025-12-01T00:00:00",
             "source": source_location
         }
 
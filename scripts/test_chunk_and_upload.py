@@ -3,29 +3,56 @@
 Запуск: python -m pytest scripts/test_chunk_and_upload.py -v
 """
 
+import random
+
 import pytest
 from chunk_and_upload import (
     chunk_text,
+    gear_chunk,
     categorize_document,
     generate_id,
+    generate_content_id,
     CHUNK_SIZE_CHARS,
     MIN_CHUNK_CHARS,
+    CDC_MIN_CHARS,
+    CDC_MAX_CHARS,
 )
 
 
+@pytest.fixture(scope="module")
+def long_repeated_sentence():
+    """Абзац з ~100 речень, більший за CHUNK_SIZE_CHARS (будується раз на модуль)."""
+    return "Це речення номер один. " * 100
+
+
+@pytest.fixture(scope="module")
+def long_unicode_paragraph():
+    """Довгий український текст (будується раз на модуль)."""
+    return "Договір про нерозголошення конфіденційної інформації. " * 20
+
+
+@pytest.fixture(scope="module")
+def cdc_text():
+    """Довгий текст зі звичайних слів для CDC (будується раз на модуль)."""
+    rng = random.Random(42)
+    words = ["облік", "податок", "договір", "стаття", "аудит", "баланс",
+             "звіт", "актив", "пасив", "рахунок", "накладна", "витрати"]
+    return " ".join(rng.choice(words) for _ in range(12000))
+
+
 class TestChunkText:
     """Тести для функції chunk_text."""
 
     def test_empty_text(self):
         """Порожній текст повертає порожній список."""
-        assert chunk_text("") == []
-        assert chunk_text("   \n\n   ") == []
+        assert list(chunk_text("")) == []
+        assert list(chunk_text("   \n\n   ")) == []
 
     def test_short_text_single_chunk(self):
         """Текст >= MIN_CHUNK_CHARS залишається одним chunk."""
         # Текст має бути >= 100 символів (MIN_CHUNK_CHARS)
         text = "Це текст про NDA договір. " * 5  # ~130 символів
-        chunks = chunk_text(text)
+        chunks = list(chunk_text(text))
         assert len(chunks) == 1
 
     def test_paragraphs_split(self):
@@ -33,7 +60,7 @@ class TestChunkText:
         para1 = "А" * 1500
         para2 = "Б" * 1500
         text = f"{para1}\n\n{para2}"
-        chunks = chunk_text(text)
+        chunks = list(chunk_text(text))
         assert len(chunks) == 2
 
     def test_small_paragraphs_combined(self):
@@ -41,7 +68,7 @@ class TestChunkText:
         # Кожен абзац ~50 символів, разом ~150 > MIN_CHUNK_CHARS
         para = "Це абзац тексту про договір NDA номер "
         text = f"{para}один.\n\n{para}два.\n\n{para}три."
-        chunks = chunk_text(text)
+        chunks = list(chunk_text(text))
         assert len(chunks) == 1
         assert "один" in chunks[0]
         assert "три" in chunks[0]
@@ -49,60 +76,52 @@ class TestChunkText:
     def test_very_short_chunks_filtered(self):
         """Chunks менше MIN_CHUNK_CHARS відфільтровуються."""
         text = "Коротко.\n\n" + "Х" * 500
-        chunks = chunk_text(text)
+        chunks = list(chunk_text(text))
         # "Коротко." має < MIN_CHUNK_CHARS, тому відфільтрується
         assert all(len(c) >= MIN_CHUNK_CHARS for c in chunks)
 
-    def test_long_paragraph_split_by_sentences(self):
+    def test_long_paragraph_split_by_sentences(self, long_repeated_sentence):
         """Довгий абзац розбивається по реченнях."""
-        # Створюємо абзац більший за CHUNK_SIZE_CHARS (2000)
-        # "Це речення номер один. " = 24 символи, потрібно ~100 для 2400 символів
-        sentences = ["Це речення номер один. "] * 100
-        text = "".join(sentences)
-        chunks = chunk_text(text)
+        chunks = list(chunk_text(long_repeated_sentence))
         assert len(chunks) > 1
         assert all(len(c) <= CHUNK_SIZE_CHARS + 100 for c in chunks)
 
-    def test_unicode_handling(self):
+    def test_windows_overlap(self, long_repeated_sentence):
+        """Сусідні вікна перекриваються (крок CHUNK_STRIDE < розміру вікна)."""
+        text = long_repeated_sentence * 3  # ~7000 символів, кілька вікон
+        chunks = list(chunk_text(text))
+        assert len(chunks) > 2
+        # Початок кожного наступного вікна лежить всередині попереднього
+        for prev, nxt in zip(chunks, chunks[1:]):
+            assert nxt[:100] in prev
+        # Через перекриття вікон більше, ніж дало б щільне пакування
+        assert len(chunks) > len(text) // CHUNK_SIZE_CHARS
+
+    def test_unicode_handling(self, long_unicode_paragraph):
         """Коректна обробка українського тексту."""
-        text = "Договір про нерозголошення конфіденційної інформації. " * 20
-        chunks = chunk_text(text)
+        chunks = list(chunk_text(long_unicode_paragraph))
         assert len(chunks) >= 1
         assert "Договір" in chunks[0]
 
 
-class TestCategorizeDocument:
-    """Тести для функції categorize_document."""
-
-    def test_legislation(self):
-        """Файли із 'закон' категоризуються як legislation."""
-        assert categorize_document("Закон про авторське право.md") == "legislation"
-        assert categorize_document("закон_про_ІВ.md") == "legislation"
-
-    def test_research_gems(self):
-        """Файли Gem категоризуються як research."""
-        assert categorize_document("Gem 1 Договори про ОІВ.md") == "research"
-        assert categorize_document("gem_15_аналіз.md") == "research"
-
-    def test_articles(self):
-        """Expert articles категоризуються як article."""
-        assert categorize_document("13 Expert article - NDA.md") == "article"
-        assert categorize_document("article_про_nca.md") == "article"
-
-    def test_contracts(self):
-        """Договори категоризуються як contract."""
-        assert categorize_document("договір_NDA.md") == "contract"
-        assert categorize_document("NDA_template.md") == "contract"
-
-    def test_analysis(self):
-        """Аналізи категоризуються як analysis."""
-        assert categorize_document("Аналіз_змін_документа.md") == "analysis"
-        assert categorize_document("Gem 7 Аналіз змін NDA.md") == "research"  # Gem має пріоритет
-
-    def test_other(self):
-        """Невідомі файли категоризуються як other."""
-        assert categorize_document("random_file.md") == "other"
-        assert categorize_document("notes.md") == "other"
+@pytest.mark.parametrize("filename,expected", [
+    ("Закон про авторське право.md", "legislation"),
+    ("закон_про_ІВ.md", "legislation"),
+    ("Gem 1 Договори про ОІВ.md", "research"),
+    ("gem_15_аналіз.md", "research"),
+    ("13 Expert article - NDA.md", "article"),
+    ("article_про_nca.md", "article"),
+    ("договір_NDA.md", "contract"),
+    ("NDA_template.md", "contract"),
+    ("Аналіз_змін_документа.md", "analysis"),
+    ("Gem 7 Аналіз змін NDA.md", "research"),  # Gem має пріоритет
+    ("Аналіз Gem 7.md", "research"),           # ...навіть коли Аналіз лівіше
+    ("random_file.md", "other"),
+    ("notes.md", "other"),
+], ids=lambda v: v if isinstance(v, str) and v.endswith(".md") else None)
+def test_categorize_document(filename, expected):
+    """Категоризація документів за назвою файлу."""
+    assert categorize_document(filename) == expected
 
 
 class TestGenerateId:
@@ -137,5 +156,57 @@ class TestGenerateId:
         int(id1, 16)  # Має не викидати exception
 
 
+class TestGearChunk:
+    """Тести для функції gear_chunk (content-defined chunking)."""
+
+    def test_full_coverage(self, cdc_text):
+        """Чанки покривають весь текст (крім хвоста < MIN_CHUNK_CHARS)."""
+        joined = "".join(gear_chunk(cdc_text))
+        assert cdc_text.startswith(joined)
+        assert len(cdc_text) - len(joined) < MIN_CHUNK_CHARS
+
+    def test_chunk_size_bounds(self, cdc_text):
+        """Розмір чанків в межах CDC_MIN_CHARS..CDC_MAX_CHARS."""
+        chunks = gear_chunk(cdc_text)
+        assert len(chunks) > 2
+        assert all(len(c) <= CDC_MAX_CHARS for c in chunks)
+        # Останній чанк — залишок, може бути коротшим за мінімум
+        assert all(len(c) >= CDC_MIN_CHARS for c in chunks[:-1])
+
+    def test_prepend_edit_keeps_ids(self, cdc_text):
+        """Вставка на початку не змінює ID чанків далі по тексту."""
+        orig_ids = set(map(generate_content_id, gear_chunk(cdc_text)))
+        edited = "ПРЕАМБУЛА. Вступне речення документа. " + cdc_text
+        edited_ids = set(map(generate_content_id, gear_chunk(edited)))
+        # Зсув зачіпає лише чанк(и) біля правки, решта стабільні
+        assert len(orig_ids & edited_ids) >= len(orig_ids) - 2
+
+    def test_middle_edit_keeps_ids(self, cdc_text):
+        """Вставка в середині зачіпає лише сусідні чанки."""
+        orig_ids = set(map(generate_content_id, gear_chunk(cdc_text)))
+        mid = len(cdc_text) // 2
+        edited = cdc_text[:mid] + " ДОПОВНЕННЯ ДО РОЗДІЛУ. " + cdc_text[mid:]
+        edited_ids = set(map(generate_content_id, gear_chunk(edited)))
+        assert len(orig_ids & edited_ids) >= len(orig_ids) - 2
+
+
+class TestGenerateContentId:
+    """Тести для функції generate_content_id."""
+
+    def test_consistent_id(self):
+        """Однаковий текст генерує однаковий ID."""
+        assert generate_content_id("текст чанка") == generate_content_id("текст чанка")
+
+    def test_different_text_different_ids(self):
+        """Різний текст генерує різні ID."""
+        assert generate_content_id("текст один") != generate_content_id("текст два")
+
+    def test_id_length_and_hex(self):
+        """ID — 16 hex-символів."""
+        cid = generate_content_id("текст чанка")
+        assert len(cid) == 16
+        int(cid, 16)  # Має не викидати exception
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])